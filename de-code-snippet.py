@@ -7,9 +7,25 @@ import numpy as np
 import json
 import logging
 from datetime import datetime, timedelta
-import random
 import os
 
+try:
+    import orjson
+except ImportError:  # orjson is optional, stdlib json still works
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from pyarrow import csv as pa_csv
+except ImportError:  # pyarrow is optional, pandas CSV writer still works
+    pa = None
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional, the NumPy kernel is the fallback
+    njit = None
+
 # Logging configuration
 logging.basicConfig(
     level=logging.INFO,
@@ -19,8 +35,45 @@ logger = logging.getLogger('supercourier_mini_etl')
 
 # Constants
 DB_PATH = 'supercourier_mini.db'
-WEATHER_PATH = 'weather_data.json'
+WEATHER_PATH = 'weather_data.jsonl'
 OUTPUT_PATH = 'deliveries.csv'
+PARQUET_PATH = 'deliveries.parquet'
+
+# Single seeded generator for every sampling step (reproducible runs)
+RNG = np.random.default_rng(42)
+
+WEEKDAY_NAMES = np.array(
+    ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+)
+
+# Category orders shared by the data generators and the transform; each
+# *_MULT array is aligned entry-for-entry with its order
+PKG_ORDER = ('Small', 'Medium', 'Large', 'X-Large', 'Special')
+PKG_MULT = np.array([1, 1.2, 1.5, 2, 2.5], dtype=np.float32)
+ZONE_ORDER = ('Urban', 'Suburban', 'Rural', 'Industrial', 'Shopping Center')
+ZONE_MULT = np.array([1.2, 1, 1.3, 0.9, 1.4], dtype=np.float32)
+WEATHER_ORDER = ('Sunny', 'Cloudy', 'Rainy', 'Windy', 'Snowy', 'Foggy')
+WEATHER_MULT = np.array([1, 1.05, 1.2, 1.1, 1.8, 1.3], dtype=np.float32)
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _delay_kernel(distance, speed_factor, pkg_codes, zone_codes, weather_codes,
+                      pkg_mult, zone_mult, weather_mult):
+        """
+        Multithreaded version of the fused delay computation in
+        transform_data; returns (actual_time, delayed)
+        """
+        n = distance.shape[0]
+        actual_time = np.empty(n, dtype=np.float32)
+        delayed = np.empty(n, dtype=np.bool_)
+        for i in prange(n):
+            adjustment = (pkg_mult[pkg_codes[i]]
+                          * zone_mult[zone_codes[i]]
+                          * weather_mult[weather_codes[i]])
+            base_theoretical_time = 30 + distance[i] * np.float32(0.8)
+            actual_time[i] = distance[i] * speed_factor[i] + 30
+            delayed[i] = actual_time[i] > base_theoretical_time * adjustment * np.float32(1.2)
+        return actual_time, delayed
 
 # 1. FUNCTION TO GENERATE SQLITE DATABASE (you can modify as needed)
 def create_sqlite_database():
@@ -33,65 +86,45 @@ def create_sqlite_database():
     if os.path.exists(DB_PATH):
         os.remove(DB_PATH)
     
-    # Connect to database
+    # Connect to database; relax durability for the bulk load, the file
+    # is regenerated from scratch anyway
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Create deliveries table
-    cursor.execute('''
-    CREATE TABLE deliveries (
-        delivery_id INTEGER PRIMARY KEY,
-        pickup_datetime TEXT,
-        package_type TEXT,
-        delivery_zone TEXT,
-        recipient_id INTEGER
-    )
-    ''')
-    
-    # Available package types and delivery zones
-    package_types = ['Small', 'Medium', 'Large', 'X-Large', 'Special']
-    delivery_zones = ['Urban', 'Suburban', 'Rural', 'Industrial', 'Shopping Center']
-    
-    # Generate 1000 random deliveries
-    deliveries = []
-    
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA journal_mode=MEMORY')
+
+    # Generate 1000 random deliveries, all columns at once (vectorized)
+    n_deliveries = 1000
+
     end_date = datetime.now()
     start_date = end_date - timedelta(days=90)  # 3 months
-    
-    for i in range(1, 1001):
-        # Random date within last 3 months
-        timestamp = start_date + timedelta(
-            seconds=random.randint(0, int((end_date - start_date).total_seconds()))
-        )
-        
-        # Random selection of package type and zone
-        package_type = random.choices(
-            package_types, 
-            weights=[25, 30, 20, 15, 10]  # Relative probabilities
-        )[0]
-        
-        delivery_zone = random.choice(delivery_zones)
-        
-        # Add to list
-        deliveries.append((
-            i,  # delivery_id
-            timestamp.strftime('%Y-%m-%d %H:%M:%S'),  # pickup_datetime
-            package_type,
-            delivery_zone,
-            random.randint(1, 100)  # fictional recipient_id
-        ))
-    
-    # Insert data
-    cursor.executemany(
-        'INSERT INTO deliveries VALUES (?, ?, ?, ?, ?)',
-        deliveries
+
+    # Random dates within last 3 months
+    seconds_offsets = RNG.integers(
+        0, int((end_date - start_date).total_seconds()), n_deliveries
     )
-    
+    timestamps = pd.to_datetime(start_date) + pd.to_timedelta(seconds_offsets, 's')
+
+    df = pd.DataFrame({
+        'delivery_id': np.arange(1, n_deliveries + 1),
+        'pickup_datetime': timestamps.strftime('%Y-%m-%d %H:%M:%S'),
+        'package_type': RNG.choice(
+            PKG_ORDER,
+            n_deliveries,
+            p=[0.25, 0.30, 0.20, 0.15, 0.10]  # Relative probabilities
+        ),
+        'delivery_zone': RNG.choice(ZONE_ORDER, n_deliveries),
+        'recipient_id': RNG.integers(1, 101, n_deliveries)  # fictional
+    })
+
+    # Insert data in multi-row batches within a single transaction
+    df.to_sql('deliveries', conn, if_exists='replace', index=False,
+              method='multi', chunksize=500)
+
     # Commit and close
     conn.commit()
     conn.close()
-    
-    logger.info(f"Database created with {len(deliveries)} deliveries")
+
+    logger.info(f"Database created with {n_deliveries} deliveries")
     return True
 
 # 2. FUNCTION TO GENERATE WEATHER DATA
@@ -101,39 +134,37 @@ def generate_weather_data():
     """
     logger.info("Generating weather data...")
     
-    conditions = ['Sunny', 'Cloudy', 'Rainy', 'Windy', 'Snowy', 'Foggy']
-    weights = [30, 25, 20, 15, 5, 5]  # Relative probabilities
+    weights = [30, 25, 20, 15, 5, 5]  # Relative probabilities, per WEATHER_ORDER
     
     end_date = datetime.now()
     start_date = end_date - timedelta(days=90)
     
-    weather_data = {}
-    
-    current_date = start_date
-    while current_date <= end_date:
-        date_str = current_date.strftime('%Y-%m-%d')
-        weather_data[date_str] = {}
-        
-        # For each day, generate weather for each hour
-        for hour in range(24):
-            # More continuity in conditions
-            if hour > 0 and random.random() < 0.7:
-                # 70% chance of keeping same condition as previous hour
-                condition = weather_data[date_str].get(str(hour-1), 
-                                                      random.choices(conditions, weights=weights)[0])
+    n_days = (end_date - start_date).days + 1
+    probabilities = np.array(weights) / sum(weights)
+
+    # Sample every (day, hour) condition at once
+    conds = RNG.choice(WEATHER_ORDER, size=(n_days, 24), p=probabilities)
+
+    # More continuity in conditions: 70% chance of keeping same condition
+    # as previous hour, propagated one vectorized column at a time
+    keep_previous = RNG.random((n_days, 24)) < 0.7
+    for hour in range(1, 24):
+        conds[:, hour] = np.where(keep_previous[:, hour], conds[:, hour - 1], conds[:, hour])
+
+    dates = pd.date_range(start_date.date(), periods=n_days, freq='D').strftime('%Y-%m-%d')
+
+    # Save as newline-delimited JSON, one day object per line, so peak
+    # memory stays at a single day instead of the whole period
+    with open(WEATHER_PATH, 'wb') as f:
+        for i, date_str in enumerate(dates):
+            day = {'date': date_str, 'hours': conds[i].tolist()}
+            if orjson is not None:
+                f.write(orjson.dumps(day) + b'\n')
             else:
-                condition = random.choices(conditions, weights=weights)[0]
-            
-            weather_data[date_str][str(hour)] = condition
-        
-        current_date += timedelta(days=1)
-    
-    # Save as JSON
-    with open(WEATHER_PATH, 'w', encoding='utf-8') as f:
-        json.dump(weather_data, f, ensure_ascii=False, indent=2)
-    
+                f.write(json.dumps(day).encode('utf-8') + b'\n')
+
     logger.info(f"Weather data generated for period {start_date.strftime('%Y-%m-%d')} - {end_date.strftime('%Y-%m-%d')}")
-    return weather_data
+    return True
 
 # 3. EXTRACTION FUNCTIONS (to be completed)
 def extract_sqlite_data():
@@ -143,28 +174,57 @@ def extract_sqlite_data():
     logger.info("Extracting data from SQLite database...")
     
     conn = sqlite3.connect(DB_PATH)
-    query = "SELECT * FROM deliveries"
-    df = pd.read_sql(query, conn)
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA journal_mode=MEMORY')
+    query = """
+    SELECT delivery_id, pickup_datetime, package_type, delivery_zone, recipient_id
+    FROM deliveries
+    """
+    # The generator writes a fixed ISO format, so pin it: the C fast-path
+    # parser is used instead of per-value format inference
+    df = pd.read_sql_query(
+        query, conn,
+        parse_dates={'pickup_datetime': {'format': '%Y-%m-%d %H:%M:%S'}}
+    )
     conn.close()
 
-    # I want to hava DATE and HOUR separated to be able to get the weather 
-    # Creation of two new features 
-    df['pickup_datetime'] = pd.to_datetime(df['pickup_datetime'], errors='coerce')
+    # SQLite hands back int64; the ids comfortably fit 32 bits
+    df = df.astype({'delivery_id': 'int32', 'recipient_id': 'int32'})
+
+    # I want to hava DATE and HOUR separated to be able to get the weather
+    # Creation of two new features
+    # Integer join keys: the day ordinal and hour hash much cheaper than
+    # the formatted strings; pickup_date stays around for the final output.
+    # Days-since-epoch via timedelta stays correct whatever datetime
+    # resolution pandas hands back (ns on 2.x, us on 3.x)
+    df['pickup_date_ord'] = (
+        df['pickup_datetime'].dt.normalize() - pd.Timestamp('1970-01-01')
+    ).dt.days.astype('int32')
+    df['pickup_hour'] = df['pickup_datetime'].dt.hour.astype('int8')
     df['pickup_date'] = df['pickup_datetime'].dt.strftime('%Y-%m-%d')
-    df['pickup_hour'] = df['pickup_datetime'].dt.hour.astype(str)
+
+    # 5-ish distinct values each: categorical codes are much lighter than
+    # per-row Python strings
+    for col in ['package_type', 'delivery_zone']:
+        df[col] = df[col].astype('category')
     
     logger.info(f"Extraction complete: {len(df)} records")
     return df
 
 def load_weather_data():
     """
-    Loads weather data from JSON file
+    Loads weather data from the newline-delimited JSON file
     """
     logger.info("Loading weather data...")
-    
-    with open(WEATHER_PATH, 'r', encoding='utf-8') as f:
-        weather_data = json.load(f)
-    
+
+    weather_data = {}
+    with open(WEATHER_PATH, 'rb') as f:
+        for line in f:
+            day = orjson.loads(line) if orjson is not None else json.loads(line)
+            weather_data[day['date']] = {
+                str(hour): condition for hour, condition in enumerate(day['hours'])
+            }
+
     logger.info(f"Weather data loaded for {len(weather_data)} days")
     return weather_data
 
@@ -180,23 +240,42 @@ def enrich_with_weather(df, weather_data):
     # Convert date column to datetime
     # df['pickup_datetime'] = pd.to_datetime(df['pickup_datetime'])
     
-    # Here I transform the weather data to df
-
-    weather_records = []
-    for date_str, hours in weather_data.items():
-        for hour_str, condition in hours.items():
-            weather_records.append({
-                'pickup_date': date_str,
-                'pickup_hour': hour_str,
-                'WeatherCondition': condition
-            })
-    
-    weather_df = pd.DataFrame(weather_records)
-    # Merge the data
-    merged_df = pd.merge(df, weather_df, on=['pickup_date', 'pickup_hour'], how='left')
-    
+    # Here I collapse the weather data to a (date ordinal, hour) -> condition
+    # lookup Series and probe it with the integer keys built at extraction
+
+    dates = list(weather_data)
+    date_ords = (
+        (pd.to_datetime(dates) - pd.Timestamp('1970-01-01')).days.astype('int32')
+    )
+    lookup = pd.Series(
+        np.fromiter(
+            (weather_data[d][str(h)] for d in dates for h in range(24)),
+            dtype=object, count=len(dates) * 24
+        ),
+        index=pd.MultiIndex.from_arrays(
+            [np.repeat(date_ords, 24), np.tile(np.arange(24, dtype='int8'), len(dates))],
+            names=['pickup_date_ord', 'pickup_hour']
+        ),
+        name='WeatherCondition'
+    )
+
+    # A monotonic unique index gives the probe its fast path; duplicate
+    # (date, hour) keys would silently pick one condition, so refuse them
+    # (the many_to_one guarantee a validated merge would have given us)
+    lookup = lookup.sort_index()
+    if not lookup.index.is_unique:
+        raise ValueError("Duplicate (date, hour) keys in weather data")
+
+    # Probe with the two key columns only and assign the result in place:
+    # nothing else from the deliveries frame travels through the join
+    keys = pd.MultiIndex.from_arrays(
+        [df['pickup_date_ord'].values, df['pickup_hour'].values],
+        names=['pickup_date_ord', 'pickup_hour']
+    )
+    df['WeatherCondition'] = lookup.reindex(keys).values
+
     logger.info("Weather enrichment complete")
-    return merged_df
+    return df
 
 
 def transform_data(df_deliveries, weather_data):
@@ -209,44 +288,47 @@ def transform_data(df_deliveries, weather_data):
 
     # 1.Enrich deliveries data with weather
     new_df = enrich_with_weather(df_deliveries, weather_data)
+    # Only the joined WeatherCondition can be missing; drop those rows now
+    # so the random distances/times below are only drawn for kept rows
+    new_df = new_df.loc[new_df['WeatherCondition'].notna()].reset_index(drop=True)
+    new_df['WeatherCondition'] = pd.Categorical(
+        new_df['WeatherCondition'], categories=WEATHER_ORDER)
+    new_df['package_type'] = new_df['package_type'].cat.set_categories(PKG_ORDER)
+    new_df['delivery_zone'] = new_df['delivery_zone'].cat.set_categories(ZONE_ORDER)
 
     # 2 Calculate the needed data
-    new_df['Distance'] = np.round(np.random.uniform(1, 50, size=len(new_df)), 2)
-    new_df['Actual_Delivery_Time'] = new_df['Distance'] * np.random.uniform(0.8, 1.5, size=len(new_df)) + 30
-    new_df['Actual_Delivery_Time'] = new_df['Actual_Delivery_Time'].round(2)
-    new_df['Weekday'] = new_df['pickup_datetime'].dt.day_name()
-
-    parcel = {
-        'Small': 1,
-        'Medium': 1.2,
-        'Large': 1.5,
-        'X-Large': 2,
-        'Special': 2.5
-    }
-    zone = {
-        'Urban': 1.2,
-        'Suburban': 1,
-        'Rural': 1.3,
-        'Industrial': 0.9,
-        'Shopping Center': 1.4
-    }
-    weather = {
-        'Sunny': 1,
-        'Cloudy': 1.05,
-        'Rainy': 1.2,
-        'Windy': 1.1,
-        'Snowy': 1.8,
-        'Foggy': 1.3
-    }
-    new_df['Base_Theoretical_Time'] = 30 + new_df['Distance'] * 0.8
-    new_df['Adjustment'] = new_df['package_type'].map(parcel) * \
-                               new_df['delivery_zone'].map(zone) * \
-                               new_df['WeatherCondition'].map(weather).fillna(1)
-    new_df['Adjusted_Time'] = new_df['Base_Theoretical_Time'] * new_df['Adjustment']
-    new_df['Delay_Threshold'] = new_df['Adjusted_Time'] * 1.2
-    new_df['Status'] = np.where(new_df['Actual_Delivery_Time'] > new_df['Delay_Threshold'], 'Delayed', 'On-time')
-
-    new_df = new_df.dropna()
+    weekday_codes = new_df['pickup_datetime'].dt.dayofweek.values.astype('int8')
+    new_df['Weekday'] = pd.Categorical.from_codes(weekday_codes, WEEKDAY_NAMES)
+
+    # Fused float32 kernel: the module-level multiplier LUTs are gathered by
+    # categorical code, so the delay arithmetic is one streaming pass with
+    # no intermediate columns stored on the frame
+    n_rows = len(new_df)
+    distance = np.round(RNG.uniform(1, 50, n_rows), 2).astype(np.float32)
+    speed_factor = RNG.uniform(0.8, 1.5, n_rows).astype(np.float32)
+
+    pkg_codes = new_df['package_type'].cat.codes.values
+    zone_codes = new_df['delivery_zone'].cat.codes.values
+    weather_codes = new_df['WeatherCondition'].cat.codes.values
+
+    if njit is not None:
+        actual_time, delayed = _delay_kernel(
+            distance, speed_factor, pkg_codes, zone_codes, weather_codes,
+            PKG_MULT, ZONE_MULT, WEATHER_MULT)
+    else:
+        adjustment = (PKG_MULT[pkg_codes]
+                      * ZONE_MULT[zone_codes]
+                      * WEATHER_MULT[weather_codes])
+        base_theoretical_time = 30 + distance * np.float32(0.8)
+        actual_time = distance * speed_factor + 30
+        delayed = actual_time > base_theoretical_time * adjustment * np.float32(1.2)
+
+    new_df['Distance'] = distance
+    new_df['Actual_Delivery_Time'] = actual_time.round(2)
+    new_df['Status'] = pd.Categorical(
+        np.where(delayed, 'Delayed', 'On-time'),
+        categories=['On-time', 'Delayed']
+    )
 
     needed_col = ['delivery_id', 'pickup_datetime', 'Weekday', 'pickup_date','pickup_hour', 'package_type', 'Distance',
         'delivery_zone', 'WeatherCondition', 'Actual_Delivery_Time', 'Status']
@@ -258,16 +340,32 @@ def transform_data(df_deliveries, weather_data):
 # 5. LOADING FUNCTION (to be completed)
 def save_results(df):
     """
-    Saves the final DataFrame to CSV
+    Saves the final DataFrame to Parquet (primary) and CSV
     """
     logger.info("Saving results...")
-    
+
     # TODO: Add your data validation code here
-    
-    # Save to CSV
-    df.to_csv(OUTPUT_PATH, index=False)
-    
-    logger.info(f"Results saved to {OUTPUT_PATH}")
+
+    if pa is None:
+        # No pyarrow: keep the original single-threaded CSV output
+        df.to_csv(OUTPUT_PATH, index=False)
+        logger.info(f"Results saved to {OUTPUT_PATH}")
+        return True
+
+    # Columnar + compressed Parquet as primary output, CSV kept for
+    # compatibility via the multithreaded pyarrow writer
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, PARQUET_PATH, compression='zstd')
+
+    # pyarrow would render timestamps with a fractional part; pre-format
+    # pickup_datetime so the CSV text matches the to_csv fallback exactly
+    csv_table = pa.Table.from_pandas(
+        df.assign(pickup_datetime=df['pickup_datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')),
+        preserve_index=False
+    )
+    pa_csv.write_csv(csv_table, OUTPUT_PATH)
+
+    logger.info(f"Results saved to {PARQUET_PATH} and {OUTPUT_PATH}")
     return True
 
 # MAIN FUNCTION
@@ -280,33 +378,15 @@ def run_pipeline():
         
         # Step 1: Generate data sources
         create_sqlite_database()
-        weather_data = generate_weather_data()
-        
+        generate_weather_data()
+
         # Step 2: Extraction
         df_deliveries = extract_sqlite_data()
-
-
-        #TO DELETE
-        # added Dyhia ->
-        print("******************* print some DELIVERIES DATA")
-        print(df_deliveries.head())
-        #TO DELETE
-        data = load_weather_data()
-        df_test = pd.DataFrame(data)
-        # print some weather data
-        print("******************* print some DELIVERIES DATA")
-        print(df_test.head())
-        #TO DELETE
-        df_test2 = enrich_with_weather(df_deliveries,data)
-        # print data transformed :
-
-        print("******************* print weather added to deliveries")
-        print(df_test2.head())
+        weather_data = load_weather_data()
 
         # Step 3: Transformation
         df_transformed = transform_data(df_deliveries, weather_data)
 
-
         # Step 4: Loading
         save_results(df_transformed)
         